@@ -5,23 +5,31 @@ given postal code(s) (default country, United States).
 Please see the README for more information.
 '''
 
-from collections import namedtuple
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from getpass import getpass
+from io import BytesIO
+import csv
+import hashlib
+import json
+import math
 import os
-import pickle
 import re
+import sqlite3
 import sys
+import threading
 import time
 
 import argparse
-from bs4 import BeautifulSoup
-from geopy.distance import great_circle
+from lxml import etree
 import pandas as pd
 import pycountry
 import requests
 from requests.adapters import HTTPAdapter
 from tqdm import tqdm
-from urllib.parse import urlparse
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse
+from urllib3.util.retry import Retry
 
 
 # ERRORS
@@ -32,6 +40,210 @@ class UnacceptedInput(Exception):
     pass
 
 
+# CONSTANTS
+# Place types supported by the Google Places API
+ACCEPTED_TYPES = frozenset(['accounting', 'airport', 'amusement_park', 'aquarium',
+                            'art_gallery', 'atm', 'bakery', 'bank', 'bar',
+                            'beauty_salon', 'bicycle_store', 'book_store',
+                            'bowling_alley', 'bus_station', 'cafe', 'campground',
+                            'car_dealer', 'car_rental', 'car_repair', 'car_wash',
+                            'casino', 'cemetery', 'church', 'city_hall',
+                            'clothing_store', 'convenience_store', 'courthouse',
+                            'dentist', 'department_store', 'doctor', 'electrician',
+                            'electronics_store', 'embassy', 'fire_station',
+                            'florist', 'funeral_home', 'furniture_store',
+                            'gas_station', 'gym', 'hair_care', 'hardware_store',
+                            'hindu_temple', 'home_goods_store', 'hospital',
+                            'insurance_agency', 'jewelry_store', 'laundry',
+                            'lawyer', 'library', 'light_rail_station',
+                            'liquor_store', 'local_government_office',
+                            'locksmith', 'lodging', 'meal_delivery',
+                            'meal_takeaway', 'mosque', 'movie_rental',
+                            'movie_theater', 'moving_company', 'museum',
+                            'night_club', 'painter', 'park', 'parking', 'pet_store',
+                            'pharmacy', 'physiotherapist', 'plumber', 'police',
+                            'post_office', 'real_estate_agency', 'restaurant',
+                            'roofing_contractor', 'rv_park', 'school', 'shoe_store',
+                            'shopping_mall', 'spa', 'stadium', 'storage', 'store',
+                            'subway_station', 'synagogue', 'taxi_stand',
+                            'train_station', 'transit_station', 'travel_agency',
+                            'university', 'veterinary_care', 'zoo'])
+
+# State codes covered by ./us_postal_codes.csv
+ACCEPTED_STATE_CODES = frozenset(['AA', 'AK', 'AL', 'AP', 'AR', 'AZ', 'CA', 'CO', 'CT',
+                                  'DC', 'DE', 'FL', 'FM', 'GA', 'HI', 'IA', 'ID', 'IL',
+                                  'IN', 'KS', 'KY', 'LA', 'MA', 'MD', 'ME', 'MH', 'MI',
+                                  'MN', 'MO', 'MP', 'MS', 'MT', 'NC', 'ND', 'NE', 'NH',
+                                  'NJ', 'NM', 'NV', 'NY', 'OH', 'OK', 'OR', 'PA', 'PW',
+                                  'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 'VA', 'VT', 'WA',
+                                  'WI', 'WV', 'WY'])
+
+EARTH_RADIUS = 6371009  # mean earth radius (m), as used by geopy's great_circle
+
+MAX_WORKERS = 20  # concurrent HTTP requests, kept low to respect Places QPS
+
+# Google API requests allowed per second. 10/s also keeps every minute within the
+# Places default quota of 600 requests per minute, so no separate minute limit is needed.
+API_QPS = 10
+
+STATE_WORKERS = 4  # postal codes grabbed at once by grab_data_for_state()
+
+CACHE_FILE = './.gmaps_cache.sqlite'  # on-disk cache of Google API responses
+
+CACHE_MAX_AGE = 30 * 24 * 60 * 60  # seconds a cached Google API response is reused
+
+API_HTTP_RETRIES = 5  # retries of a Google request failing to connect or with HTTP 429/5xx
+
+# Delays (s) between retries of a Google request answered with OVER_QUERY_LIMIT
+API_RETRY_DELAYS = (0.5, 1, 2, 4, 8)
+
+# Delays (s) between retries of a Nearby Search next_page_token that isn't valid yet
+PAGE_TOKEN_RETRY_DELAYS = (0.2, 0.4, 0.8, 1.6)
+
+MAX_HOST_WORKERS = 4  # concurrent requests to any one scraped website
+
+MAX_CONTACT_PAGES = 3  # contact pages scraped per website without emails
+
+MAX_PAGE_BYTES = 512 * 1024  # emails are read from at most this much of a web page
+
+# Google address component type -> (AddressComponents field, separator used to
+# append to the field, or None to overwrite it)
+ADDRESS_COMPONENT_FIELDS = {'street_number': ('address', None),
+                            'route': ('address', ' '),
+                            'locality': ('locality', None),
+                            'administrative_area_level_2': ('city', None),
+                            'administrative_area_level_1': ('state', None),
+                            'postal_code': ('postal_code', None),
+                            'postal_code_suffix': ('postal_code', '-')}
+
+POSTAL_CODE_REGEX = re.compile(r'\d{5}')
+
+POSTAL_CSV_REGEX = re.compile(r'\d{5}\.csv')
+
+NON_DIGIT_REGEX = re.compile(r'\D')
+
+# str.translate table deleting every non-digit ASCII character
+NON_DIGIT_TABLE = str.maketrans('', '', ''.join(chr(c) for c in range(128)
+                                                if not chr(c).isdigit()))
+
+EMAIL_REGEX = re.compile(r'([a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+)')
+
+# Last labels of EMAIL_REGEX matches in raw HTML that are asset names, not domains
+# (e.g. "logo@2x.png")
+FILE_EXTENSIONS = frozenset(['avif', 'bmp', 'css', 'eot', 'gif', 'ico', 'jpeg', 'jpg',
+                             'js', 'json', 'map', 'mjs', 'mp4', 'otf', 'pdf', 'png',
+                             'svg', 'ttf', 'webm', 'webp', 'woff', 'woff2', 'xml'])
+
+
+# HTTP SESSION
+# One pooled keep-alive session so requests to the same host reuse connections.
+# Scraped websites are often plain http, so both schemes share the same pooling.
+SESSION = requests.Session()
+# Only Google API requests get API_HTTP_RETRIES, as their throttling is worth waiting out
+API_ADAPTER = HTTPAdapter(pool_connections=32, pool_maxsize=32,
+                          max_retries=Retry(total=API_HTTP_RETRIES, backoff_factor=0.3,
+                                            status_forcelist=[429, 500, 502, 503, 504]))
+# Scraped websites aren't retried, so a dead or throttling site costs one timeout
+SCRAPE_ADAPTER = HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=0)
+SESSION.mount('https://', SCRAPE_ADAPTER)
+SESSION.mount('http://', SCRAPE_ADAPTER)
+SESSION.mount('https://maps.googleapis.com/', API_ADAPTER)
+
+
+# THREAD SYNCHRONIZATION
+class AdaptiveLimiter:
+
+    '''Caps concurrent requests with an AIMD (additive-increase, multiplicative-decrease) limit
+
+    Use as a context manager around each request and report how it went with
+    record(). The limit grows by 0.5 per healthy response up to max_limit, and
+    halves when a response was throttled or the mean latency of recent responses
+    exceeds target_latency (s). Responses to requests started before the last
+    decrease can't decrease it again, so one burst of throttling halves it once.
+    '''
+
+    def __init__(self, max_limit, target_latency=2.0, window=20):
+        self.max_limit = max_limit
+        self.limit = float(max_limit)
+        self.target_latency = target_latency
+        self.latencies = deque(maxlen=window)
+        self.last_decrease = 0.0
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+    def __enter__(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def record(self, started, latency, throttled=False):
+        with self.condition:
+            self.latencies.append(latency)
+            mean_latency = sum(self.latencies) / len(self.latencies)
+            if throttled or mean_latency > self.target_latency:
+                if started > self.last_decrease:
+                    self.limit = max(1.0, self.limit / 2)
+                    self.last_decrease = time.monotonic()
+                    self.latencies.clear()
+            else:
+                self.limit = min(float(self.max_limit), self.limit + 0.5)
+            self.condition.notify_all()
+
+
+class RateLimiter:
+
+    '''Caps requests at max_requests per sliding window of period seconds
+
+    Call wait() before each request; it blocks until sending one more request
+    keeps the window within max_requests, so no burst can overshoot a known quota.
+    '''
+
+    def __init__(self, max_requests, period=60.0):
+        self.max_requests = max_requests
+        self.period = period
+        self.sent = deque()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                while self.sent and now - self.sent[0] >= self.period:
+                    self.sent.popleft()
+                if len(self.sent) < self.max_requests:
+                    self.sent.append(now)
+                    return
+                delay = self.period - (now - self.sent[0])
+            time.sleep(delay)
+
+
+# Adapts the Google API requests in flight across all threads, up to MAX_WORKERS
+API_LIMITER = AdaptiveLimiter(MAX_WORKERS)
+
+# Keep the Google API requests of all threads under API_QPS
+API_RATE_LIMITER = RateLimiter(API_QPS, period=1.0)
+
+# Serializes use of the cache connection shared by all threads
+CACHE_LOCK = threading.Lock()
+
+# Serializes writes to a logfile shared by grab_data_for_state()'s threads
+LOG_LOCK = threading.Lock()
+
+# Serializes lookups in the place_id -> detail fetch dict a state run shares
+DETAIL_FUTURES_LOCK = threading.Lock()
+
+# Per-host semaphores, so one slow website can't tie up every scraping thread
+HOST_SEMAPHORES = dict()
+HOST_SEMAPHORES_LOCK = threading.Lock()
+
+
 # NAMED TUPLES
 Coordinates = namedtuple('Coordinates', 'lat, lng, rad')
 
@@ -48,20 +260,25 @@ def set_key(key, file_name='./.ga_key'):
     '''Create a hidden file of google api key from a string
     '''
 
-    with open(file_name, 'bw+') as pw:
-        pickle.dump(key, pw)
+    with open(file_name, 'w', encoding='utf-8') as pw:
+        pw.write('{}\n'.format(key.strip()))
+    get_key.cache_clear()
 
 
+@lru_cache(maxsize=1)
 def get_key(file_name='./.ga_key'):
 
     '''Returns the google api key needed for all requests
+
+    The key is read from disk once and cached for every later request.
     '''
 
     try:
-        with open(file_name, 'br') as pr:
-            key = pickle.load(pr)
+        with open(file_name, 'r', encoding='utf-8') as pr:
+            key = pr.read().strip()
 
-    except FileNotFoundError as e:
+    # Keys saved by older versions of this script were pickled and won't decode
+    except (FileNotFoundError, UnicodeDecodeError) as e:
         answer = input('Google API key not found. Do you want to enter it now? '
                        '[(y)es/(n)o)]: ').lower()
         if answer.startswith('y'):
@@ -81,38 +298,11 @@ def check_establishment(establishment):
 
     '''Checks if the inputted establishment is on the Google Places API list
     '''
-    
-    accepted_types = ['accounting', 'airport', 'amusement_park', 'aquarium',
-                      'art_gallery', 'atm', 'bakery', 'bank', 'bar',
-                      'beauty_salon', 'bicycle_store', 'book_store',
-                      'bowling_alley', 'bus_station', 'cafe', 'campground',
-                      'car_dealer', 'car_rental', 'car_repair', 'car_wash',
-                      'casino', 'cemetery', 'church', 'city_hall',
-                      'clothing_store', 'convenience_store', 'courthouse',
-                      'dentist', 'department_store', 'doctor', 'electrician',
-                      'electronics_store', 'embassy', 'fire_station',
-                      'florist', 'funeral_home', 'furniture_store',
-                      'gas_station', 'gym', 'hair_care', 'hardware_store',
-                      'hindu_temple', 'home_goods_store', 'hospital',
-                      'insurance_agency', 'jewelry_store', 'laundry',
-                      'lawyer', 'library', 'light_rail_station',
-                      'liquor_store', 'local_government_office',
-                      'locksmith', 'lodging', 'meal_delivery',
-                      'meal_takeaway', 'mosque', 'movie_rental',
-                      'movie_theater', 'moving_company', 'museum',
-                      'night_club', 'painter', 'park', 'parking', 'pet_store',
-                      'pharmacy', 'physiotherapist', 'plumber', 'police',
-                      'post_office', 'real_estate_agency', 'restaurant',
-                      'roofing_contractor', 'rv_park', 'school', 'shoe_store',
-                      'shopping_mall', 'spa', 'stadium', 'storage', 'store',
-                      'subway_station', 'synagogue', 'taxi_stand',
-                      'train_station', 'transit_station', 'travel_agency',
-                      'university', 'veterinary_care', 'zoo']
-
-    if establishment not in accepted_types:
+
+    if establishment not in ACCEPTED_TYPES:
         print('Invalid establishmet type. Please use a type from '
               'the following list\n')
-        print('{}\n'.format(accepted_types))
+        print('{}\n'.format(sorted(ACCEPTED_TYPES)))
 
         raise UnacceptedInput
 
@@ -124,71 +314,153 @@ def check_state_code(state_code):
     '''Checks if the inputted state_code is in the provided state--csv zipcode
     '''
  
-    accepted_state_codes = ['AA', 'AK', 'AL', 'AP', 'AR', 'AZ', 'CA', 'CO', 'CT',
-                            'DC', 'DE', 'FL', 'FM', 'GA', 'HI', 'IA', 'ID', 'IL',
-                            'IN', 'KS', 'KY', 'LA', 'MA', 'MD', 'ME', 'MH', 'MI',
-                            'MN', 'MO', 'MP', 'MS', 'MT', 'NC', 'ND', 'NE', 'NH',
-                            'NJ', 'NM', 'NV', 'NY', 'OH', 'OK', 'OR', 'PA', 'PW',
-                            'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 'VA', 'VT', 'WA',
-                            'WI', 'WV', 'WY']
- 
-    if state_code not in accepted_state_codes:
+    if state_code not in ACCEPTED_STATE_CODES:
         print('Invalid state code. Please use a type from '
               'the following list\n')
-        print('{}\n'.format(accepted_state_codes))
+        print('{}\n'.format(sorted(ACCEPTED_STATE_CODES)))
  
         raise UnacceptedInput
  
     return
 
 
-def get_string(soup_data):
+def check_status(data, url, accepted_statuses=('OK', 'ZERO_RESULTS')):
 
-    '''Returns the plain-string for the given soup_data if it exists
+    '''Throws an exception if Google API status code is non-normal
     '''
 
-    try:
-        return soup_data.string
-    except AttributeError:
-        return ''
+    if data.get('status') not in accepted_statuses:
+        print(data.get('status'))
+        print(url)
+        raise ApiStatusError
 
 
-def check_status(soup, url):
+@lru_cache(maxsize=1)
+def get_cache(file_name=CACHE_FILE):
 
-    '''Throws an exception if Google API status code is non-normal
+    '''Returns the connection to the on-disk cache of Google API responses
     '''
 
-    if get_string(soup.status) not in ('OK', 'ZERO_RESULTS'):
-        print(get_string(soup.status))
-        print(url)
-        raise ApiStatusError
+    conn = sqlite3.connect(file_name, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('CREATE TABLE IF NOT EXISTS responses '
+                 '(key BLOB PRIMARY KEY, body TEXT, url TEXT, status TEXT, ts INTEGER)')
+
+    return conn
 
 
-def make_soup(base_query, payload='', rtrn_url=False):
+def get_cache_key(base_query, payload):
 
-    '''Returns a parsable BeautifulSoup object from a HTTP request query
+    '''Returns the cache key for a Google API request, leaving out the API key
     '''
-    try:
-        page = requests.get(base_query, params=payload, timeout=10)
-    except (requests.exceptions.SSLError, requests.exceptions.ConnectionError):
-        raise
-    soup = BeautifulSoup(page.text, 'lxml')
-    check_status(soup, page.url)
 
-    return (soup, page.url) if rtrn_url else soup
+    items = sorted((k, str(v)) for k, v in dict(payload).items() if k != 'key')
+
+    return hashlib.blake2b(repr((base_query, items)).encode('utf-8')).digest()
 
 
-def get_radius(geo_data):
+def remove_key_from_url(url):
 
-    '''Returns a distance (m) that will span the geo-data given
+    '''Returns a Google API request url without its key parameter
     '''
 
-    ne_coor = (float(geo_data.viewport.northeast.lat.string),
-               float(geo_data.viewport.northeast.lng.string))
-    sw_coor = (float(geo_data.viewport.southwest.lat.string),
-               float(geo_data.viewport.southwest.lng.string))
+    parsed = urlparse(url)
+    query = [(k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True) if k != 'key']
+
+    return parsed._replace(query=urlencode(query)).geturl()
+
+
+def read_cache(cache_key):
+
+    '''Returns the cached (data, url) for a Google API request, or None if not cached
+    '''
+
+    with CACHE_LOCK:
+        row = get_cache().execute('SELECT body, url FROM responses WHERE key = ? AND ts > ?',
+                                  (cache_key, int(time.time()) - CACHE_MAX_AGE)).fetchone()
+
+    # Urls cached before keys were removed from them are cleaned on the way out
+    return (json.loads(row[0]), remove_key_from_url(row[1])) if row else None
+
+
+def write_cache(cache_key, data, url):
+
+    '''Stores the response to a Google API request in the on-disk cache
+    '''
+
+    with CACHE_LOCK:
+        conn = get_cache()
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                         (cache_key, json.dumps(data), url, data['status'],
+                          int(time.time())))
+
 
-    ne_to_sw = great_circle(ne_coor, sw_coor).meters
+def fetch_json(base_query, payload='', rtrn_url=False,
+               accepted_statuses=('OK', 'ZERO_RESULTS')):
+
+    '''Returns the decoded JSON body of a Google API HTTP request query
+
+    HTTP 429/5xx responses are retried by the session (honouring Retry-After);
+    OVER_QUERY_LIMIT responses are retried here after API_RETRY_DELAYS.
+
+    OK and ZERO_RESULTS responses are cached on disk for CACHE_MAX_AGE, except
+    paginated Nearby Search pages, whose page tokens soon expire.
+    '''
+
+    cacheable = not dict(payload).get('pagetoken')
+    if cacheable:
+        cache_key = get_cache_key(base_query, payload)
+        cached = read_cache(cache_key)
+        if cached:
+            data, url = cached
+            return (data, url) if rtrn_url else data
+
+    for delay in API_RETRY_DELAYS + (None,):
+        API_RATE_LIMITER.wait()
+        with API_LIMITER:
+            started = time.monotonic()
+            try:
+                page = SESSION.get(base_query, params=payload, timeout=10)
+            except requests.exceptions.RetryError:
+                API_LIMITER.record(started, time.monotonic() - started, throttled=True)
+                raise
+            data = page.json()
+            throttled = data.get('status') == 'OVER_QUERY_LIMIT'
+            API_LIMITER.record(started, time.monotonic() - started, throttled)
+        if not throttled or delay is None:
+            break
+        time.sleep(delay)
+    # The key is kept out of error output, the cache and the CSVs' data_source
+    url = remove_key_from_url(page.url)
+    check_status(data, url, accepted_statuses)
+    if (cacheable and data['status'] in ('OK', 'ZERO_RESULTS')
+            and 'next_page_token' not in data):
+        write_cache(cache_key, data, url)
+
+    return (data, url) if rtrn_url else data
+
+
+def get_distance(lat_1, lng_1, lat_2, lng_2):
+
+    '''Returns the great-circle distance (m) between two coordinates
+    '''
+
+    lat_1, lng_1, lat_2, lng_2 = map(math.radians, (lat_1, lng_1, lat_2, lng_2))
+    hav = (math.sin((lat_2 - lat_1) / 2) ** 2
+           + math.cos(lat_1) * math.cos(lat_2) * math.sin((lng_2 - lng_1) / 2) ** 2)
+
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(hav))
+
+
+def get_radius(geometry):
+
+    '''Returns a distance (m) that will span the geometry given
+    '''
+
+    viewport = geometry['viewport']
+    ne_to_sw = get_distance(viewport['northeast']['lat'], viewport['northeast']['lng'],
+                            viewport['southwest']['lat'], viewport['southwest']['lng'])
     radius = ne_to_sw * .6
 
     return radius
@@ -199,16 +471,16 @@ def get_coordinates(postal_code, country_code='US'):
     '''Returns a Coordinates namedtuple for the postal code and radius given
     '''
 
-    base_query = 'https://maps.googleapis.com/maps/api/geocode/xml'
+    base_query = 'https://maps.googleapis.com/maps/api/geocode/json'
     payload = {'components': 'postal_code:{}|country:{}'.format(postal_code, country_code),
                'key': get_key()}
-    soup, url = make_soup(base_query, payload, rtrn_url=True)
+    data, url = fetch_json(base_query, payload, rtrn_url=True)
 
-    geo_data = soup.geometry
-    if geo_data:
-        radius = get_radius(geo_data)
-        coors = Coordinates(lat=soup.geometry.location.lat.string,
-                            lng=soup.geometry.location.lng.string,
+    if data['results']:
+        geometry = data['results'][0]['geometry']
+        radius = get_radius(geometry)
+        coors = Coordinates(lat=geometry['location']['lat'],
+                            lng=geometry['location']['lng'],
                             rad=radius)
     else:
         print('POSTAL CODE {} NOT FOUND IN GOOGLE GEOCODING API'.format(postal_code))
@@ -218,69 +490,84 @@ def get_coordinates(postal_code, country_code='US'):
     return coors
 
 
-def get_place_ids(establishment, latitude, longitude, radius):
+def fetch_next_page(base_query, payload):
+
+    '''Helper for iter_place_ids(), returns the next page of Nearby Search results
+
+    A next_page_token is rejected with INVALID_REQUEST until Google has minted
+    it, so the request is retried with a short exponential backoff.
+    '''
+
+    for delay in PAGE_TOKEN_RETRY_DELAYS:
+        data = fetch_json(base_query, payload,
+                          accepted_statuses=('OK', 'ZERO_RESULTS', 'INVALID_REQUEST'))
+        if data['status'] != 'INVALID_REQUEST':
+            return data
+        time.sleep(delay)
+
+    return fetch_json(base_query, payload)
+
+
+def iter_place_ids(establishment, latitude, longitude, radius):
+
+    '''Yields the unique google place_ids for the given coordinates, page by page
 
-    '''Return a list of google place_ids for the given coordinates
+    Each page's place_ids are yielded as soon as it arrives, so their details
+    can be fetched while the following pages are requested.
     '''
 
-    base_query = 'https://maps.googleapis.com/maps/api/place/nearbysearch/xml'
+    base_query = 'https://maps.googleapis.com/maps/api/place/nearbysearch/json'
     payload = {'location': '{},{}'.format(latitude, longitude),
                'radius': radius,
                'type': establishment,
                'key': get_key(),
                'pagetoken': ''}
 
-    place_ids = list()
-    next_page = True
+    seen = set()
+    data = fetch_json(base_query, payload)
+    while True:
+        for result in data['results']:
+            if result['place_id'] not in seen:
+                seen.add(result['place_id'])
+                yield result['place_id']
+        if 'next_page_token' not in data:
+            break
+        payload['pagetoken'] = data['next_page_token']
+        data = fetch_next_page(base_query, payload)
 
-    while next_page:
-        soup = make_soup(base_query, payload)
-        place_ids.extend([tag.string for tag in soup.find_all('place_id')])
-        try:
-            payload['pagetoken'] = soup.next_page_token.string
-        except AttributeError:
-            next_page = False
-        if next_page:
-            time.sleep(2)  # to ensure script doesn't break usage rate limits
 
-    return place_ids
+def get_address_components(address_components):
 
+    '''Returns a AddressComponents namedtuple from the given components.
+    '''
 
-def remove_duplicates(place_ids):
+    fields = dict.fromkeys(AddressComponents._fields, '')
 
-    '''Returns a deduplicated list of place_ids
+    for comp in address_components:
+        comp_type = comp['types'][0] if comp['types'] else ''
+        field, separator = ADDRESS_COMPONENT_FIELDS.get(comp_type, (None, None))
+        if field is None:
+            continue
+        if separator:
+            fields[field] = separator.join((fields[field], comp['long_name']))
+        else:
+            fields[field] = comp['long_name']
 
-    This function is necessary as the areas of search
-    created by get_coordinates() may overlap.
-    '''
+    return AddressComponents(**fields)
 
-    return list(set(place_ids))
 
+def get_digits(raw_number):
 
-def get_address_components(address_components):
+    '''Returns only the digits of the given phone number
 
-    '''Returns a AddressComponents namedtuple from the given components.
+    Google formats phone numbers in ASCII, which the translate table handles in
+    one C-level pass; anything else falls back to the regex.
     '''
 
-    address, city, state, postal_code = '', '', '', ''
+    if raw_number.isascii():
+        return raw_number.translate(NON_DIGIT_TABLE)
 
-    for comp in address_components:
-        if get_string(comp.type) == 'street_number':
-            address = comp.long_name.string
-        elif get_string(comp.type) == 'route':
-            address = ' '.join((address, comp.long_name.string))
-        elif get_string(comp.type) == 'locality':
-            locality = comp.long_name.string
-        elif get_string(comp.type) == 'administrative_area_level_2':
-            city = comp.long_name.string
-        elif get_string(comp.type) == 'administrative_area_level_1':
-            state = comp.long_name.string
-        elif get_string(comp.type) == 'postal_code':
-            postal_code = comp.long_name.string
-        elif get_string(comp.type) == 'postal_code_suffix':
-            postal_code = '-'.join((postal_code, comp.long_name.string))
-
-    return AddressComponents(address, locality, city, state, postal_code)
+    return NON_DIGIT_REGEX.sub('', raw_number)
 
 
 def get_establishment_data(place_id):
@@ -288,18 +575,19 @@ def get_establishment_data(place_id):
     '''Return a row of data for the given google place_id
     '''
 
-    base_query = 'https://maps.googleapis.com/maps/api/place/details/xml?'
+    base_query = 'https://maps.googleapis.com/maps/api/place/details/json'
     fields = ['name', 'address_component', 'formatted_phone_number', 'website']
     payload = {'placeid': place_id,
                'fields': ','.join(fields),
                'key': get_key()}
-    soup, data_source = make_soup(base_query, payload, rtrn_url=True)
+    data, data_source = fetch_json(base_query, payload, rtrn_url=True)
 
-    establishment = get_string(soup.find_all('name')[0])
-    raw_number = get_string(soup.formatted_phone_number)
-    phone_number = re.sub(r'\D', '', raw_number) if raw_number else ''
-    addr = get_address_components(soup.find_all('address_component'))
-    website = get_string(soup.website)
+    result = data.get('result', dict())
+    establishment = result.get('name', '')
+    raw_number = result.get('formatted_phone_number', '')
+    phone_number = get_digits(raw_number)
+    addr = get_address_components(result.get('address_components', list()))
+    website = result.get('website', '')
 
     data_row = DataRow(establishment, phone_number, addr.address, addr.locality,
                        addr.city, addr.state, addr.postal_code, website, data_source)
@@ -307,131 +595,210 @@ def get_establishment_data(place_id):
     return data_row
 
 
-def write_to_log(establishment, postal_code, country_code):
+def make_data_folders(establishment, country_code):
 
-    '''Writes postal code to logfile when no establishments are found in postal code
+    '''Creates the data and log folders for a given place-type, returns the logfile path
     '''
 
     logfolder = os.path.join('data', establishment, country_code, 'logs')
-    if not os.path.isdir(logfolder):
-        os.makedirs(logfolder)
-    logfile = os.path.join(logfolder, 'logfile')
-    with open(logfile, 'a+') as wa:
-        wa.write('{}\n'.format(postal_code))
+    os.makedirs(logfolder, exist_ok=True)
+
+    return os.path.join(logfolder, 'logfile')
+
+
+def write_to_log(log_fh, postal_code):
+
+    '''Writes postal code to logfile when no establishments are found in postal code
+    '''
+
+    with LOG_LOCK:
+        log_fh.write('{}\n'.format(postal_code))
 
     return
 
 
-def write_establishment_data(data, establishment, postal_code, country_code):
+def write_establishment_data(data, establishment, postal_code, country_code, log_fh):
 
     '''Write concatenated data to CSV file
     '''
 
-    header = DataRow._fields
-    df = pd.DataFrame(data, columns=header)
-
-    df = df[df.postal_code.str.startswith(postal_code)]
-    if not df.empty:
+    rows = [row for row in data if row.postal_code.startswith(postal_code)]
+    if rows:
         data_folder = os.path.join('data', establishment, country_code)
-        if not os.path.isdir(data_folder):
-            os.makedirs(data_folder)
         csv_file = os.path.join(data_folder, '{}.csv'.format(postal_code))
-        df.to_csv(csv_file, index=False, encoding='utf-8')
+        with open(csv_file, 'w', newline='', encoding='utf-8') as w:
+            writer = csv.writer(w, lineterminator='\n')
+            writer.writerow(DataRow._fields)
+            writer.writerows(rows)
         return True
     else:
-        write_to_log(establishment, postal_code, country_code)
+        write_to_log(log_fh, postal_code)
         return False
 
 
-def check_current_data(establishment, country_code, postal_list, state_code):
+def check_current_data(establishment, country_code, postal_set, state_code):
 
-    '''Returns a list of postal codes to-be-grabbed after checking current data
+    '''Returns a set of postal codes to-be-grabbed after checking current data
     '''
 
-    postal_code_num_all = len(postal_list)
     data_folder = os.path.join('data', establishment, country_code)
-    if not os.path.isdir(data_folder):
-        os.makedirs(data_folder)
-
-    # Remove already created postal codes from postal_list
-    created_postal_list = list()
-    for dirs, folders, files in os.walk(data_folder):
-        files = [f for f in files if re.match(r'\d\d\d\d\d.csv', f)]
-        created_postal_list.extend([int(f[:-4]) for f in files
-                                   if int(f[:-4]) in postal_list])
-    for postal_code in created_postal_list:
-        postal_list.remove(postal_code)
-    postal_code_num_wo_created = len(postal_list)
-    postal_code_num_diff_1 = postal_code_num_all - postal_code_num_wo_created
-    print('{} postal code CSVs already created for {}'.format(postal_code_num_diff_1,
+
+    # Remove already created postal codes from postal_set
+    with os.scandir(data_folder) as entries:
+        created_postal_set = {int(entry.name[:5]) for entry in entries
+                              if POSTAL_CSV_REGEX.fullmatch(entry.name) and entry.is_file()}
+    created_postal_set &= postal_set
+    postal_set = postal_set - created_postal_set
+    print('{} postal code CSVs already created for {}'.format(len(created_postal_set),
                                                               state_code))
 
-    # Remove already tried postal codes from postal_list
-    logfolder = os.path.join('data', establishment, country_code, 'logs')
-    logfile = os.path.join(logfolder, 'logfile')
-    if not os.path.isdir(logfolder):
-        os.makedirs(logfolder)
-        open(logfile, 'a+').close()
-    with open(logfile, 'r') as r:
-        tried_postal_list = [int(l.rstrip('\n')) for l in r.readlines()]
-    for postal_code in tried_postal_list:
-        postal_list.remove(postal_code)
-    postal_code_num_wo_tried = len(postal_list)
-    postal_code_num_diff_2 = postal_code_num_wo_created - postal_code_num_wo_tried
+    # Remove already tried postal codes from postal_set
+    logfile = os.path.join(data_folder, 'logs', 'logfile')
+    tried_postal_set = set()
+    if os.path.isfile(logfile):
+        with open(logfile, 'r') as r:
+            tried_postal_set = {int(l) for l in r if l.strip()}
+    tried_postal_set &= postal_set
+    postal_set -= tried_postal_set
     print('{} previously searched postal codes have no '
-          '{} in {}'.format(postal_code_num_diff_2, establishment, state_code))
+          '{} in {}'.format(len(tried_postal_set), establishment, state_code))
 
-    return (postal_list, postal_code_num_diff_1 + postal_code_num_diff_2)
+    return (postal_set, len(created_postal_set) + len(tried_postal_set))
 
 
-def concatenate_postal_codes_for_state(establishment, country_code, postal_list, state_code):
+def concatenate_postal_codes_for_state(establishment, country_code, postal_set, state_code):
 
     '''Merges every postal code CSV for a given place-type and state
     '''
 
-    df = pd.DataFrame(columns=['establishment', 'phone_number', 'address', 'city',
-                               'state', 'postal_code', 'website', 'data_source'])
+    csv_names = {'{:05}.csv'.format(int(postal_code)) for postal_code in postal_set}
     folder_path = os.path.join('data', establishment, country_code)
-    for root, dirs, files in os.walk(folder_path):
-        files = [f for f in files if f[0] != '.']
-        for filename in files:
-            if filename[:-4] in postal_list:
-                f_path = os.path.join(folder_path, filename)
-                temp_df = pd.read_csv(f_path)
-                df = pd.concat((df, temp_df))
-
-    df = df.drop_duplicates()
+    with os.scandir(folder_path) as entries:
+        csv_files = sorted(entry.path for entry in entries if entry.name in csv_names)
+
+    # Stream rows straight into the state CSV rather than building one big frame
     out_file = os.path.join(folder_path, '{}_all_postal_codes.csv'.format(state_code))
-    df.to_csv(out_file, index=False)
+    seen_rows = set()
+    with open(out_file, 'w', newline='', encoding='utf-8') as w:
+        writer = csv.writer(w, lineterminator='\n')
+        writer.writerow(DataRow._fields)
+        for csv_file in csv_files:
+            with open(csv_file, 'r', newline='', encoding='utf-8') as r:
+                reader = csv.reader(r)
+                next(reader, None)  # skip header
+                for row in map(tuple, reader):
+                    if row not in seen_rows:
+                        seen_rows.add(row)
+                        writer.writerow(row)
     print('Full {} CSV for {} created'.format(establishment, state_code))
     
     return
 
 
-def find_email_addresses(soup, url):
+def normalize_url(url):
+
+    '''Returns the url with a lower-case scheme and host and without a fragment
+    '''
+
+    parsed_url = urlparse(url)
+
+    return parsed_url._replace(scheme=parsed_url.scheme.lower(),
+                               netloc=parsed_url.netloc.lower(),
+                               fragment='').geturl()
+
+
+def get_host_semaphore(url):
+
+    '''Returns the semaphore limiting concurrent requests to the url's host
+    '''
+
+    host = urlparse(url).netloc.lower()
+    with HOST_SEMAPHORES_LOCK:
+        if host not in HOST_SEMAPHORES:
+            HOST_SEMAPHORES[host] = threading.Semaphore(MAX_HOST_WORKERS)
+
+        return HOST_SEMAPHORES[host]
+
+
+def fetch_html(url):
+
+    '''Returns the (possibly truncated) text of a web page, or '' if it isn't HTML
+
+    Only the first MAX_PAGE_BYTES are downloaded, so PDFs, images and huge
+    pages can't stall the email scraping.
+    '''
+
+    with get_host_semaphore(url), SESSION.get(url, timeout=10, stream=True) as page:
+        if 'html' not in page.headers.get('Content-Type', ''):
+            return ''
+        content = page.raw.read(MAX_PAGE_BYTES, decode_content=True)
+
+    return content.decode(page.encoding or 'utf-8', errors='replace')
+
+
+def is_email(match):
+
+    '''Returns False for an EMAIL_REGEX match that is an asset or package name
+
+    Raw HTML holds names like "logo@2x.png" or "bootstrap@5.3.0", whose last
+    label is a file extension or a version number rather than a domain.
+    '''
+
+    last_label = match.rstrip('.').rsplit('.', 1)[-1].lower()
+
+    return last_label not in FILE_EXTENSIONS and not last_label.isdigit()
+
+
+@lru_cache(maxsize=4096)
+def find_contact_page_emails(page):
+
+    '''Helper for find_email_addresses(), returns email addresses found on a contact page
+
+    Results are cached by normalized url, as chains and multi-location businesses
+    share the same contact page across many establishments.
+    '''
+
+    return tuple(filter(is_email, EMAIL_REGEX.findall(fetch_html(page))))
+
+
+def find_contact_links(html, url):
+
+    '''Helper for find_email_addresses(), returns the contact page links on a web page
+
+    Only <a> elements are visited. The parser still builds the page's tree, so
+    memory is bounded by fetch_html() reading at most MAX_PAGE_BYTES.
+    '''
+
+    contact_links = list()
+    anchors = etree.iterparse(BytesIO(html.encode('utf-8')), events=('end',), tag='a',
+                              html=True, recover=True, encoding='utf-8')
+    for event, anchor in anchors:
+        href = anchor.get('href')
+        if href and 'contact' in href.lower():
+            contact_links.append(normalize_url(urljoin(url, href)))
+
+    return contact_links
+
+
+def find_email_addresses(html, url):
 
     '''Helper for get_emails(), returns email addresses found on a given website and it's contact page
+
+    Emails are matched against the raw HTML. Only when the website itself has
+    none (after dropping asset names, see is_email()) is it parsed for contact
+    page links, and only the first MAX_CONTACT_PAGES of those are scraped.
     '''
-    email_regex = re.compile(r'([a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+)')
 
-    link_list = [a.get('href') for a in soup.find_all('a') if a.get('href') is not None]
-    link_list.extend([a.get_text() for a in soup.find_all('a')])
-    potential_emails = email_regex.findall(' '.join(link_list))
+    potential_emails = list(filter(is_email, EMAIL_REGEX.findall(html)))
 
-    contact_paths = [link for link in link_list if (('contact' in link.lower()))]
-    parsed_url = urlparse(url)
-    clean_url = '{p.scheme}://{p.netloc}{p.path}'.format(p=parsed_url)
-    contact_pages = [''.join((clean_url, c_path)) for c_path in contact_paths]
-    contact_pages = list(set(contact_pages))
-
-    for page in contact_pages:
-        ret_page = requests.get(page, timeout=10)
-        soup_2 = BeautifulSoup(ret_page.text, 'lxml')
-        link_list_2 = [a.get('href') for a in soup_2.find_all('a')
-                       if a.get('href') is not None]
-        link_list_2.extend([a.get_text() for a in soup_2.find_all('a')])
-        potential_emails_2 = email_regex.findall(' '.join(link_list_2))
-        potential_emails.extend(potential_emails_2)
+    if not potential_emails and 'contact' in html.lower():
+        contact_pages = list(dict.fromkeys(find_contact_links(html, url)))
+        contact_pages = contact_pages[:MAX_CONTACT_PAGES]
+
+        with ThreadPoolExecutor(max_workers=MAX_CONTACT_PAGES) as executor:
+            for contact_page_emails in executor.map(find_contact_page_emails,
+                                                    contact_pages):
+                potential_emails.extend(contact_page_emails)
 
     set_emails = list(set(potential_emails))
             
@@ -447,9 +814,7 @@ def get_emails(url):
         return ''
 
     try:
-        page = requests.get(url, timeout=10)
-        soup = BeautifulSoup(page.text, 'lxml')
-        emails = find_email_addresses(soup, url)
+        emails = find_email_addresses(fetch_html(url), url)
     except Exception as e:
         # TODO :: add better error handling
         print(e)
@@ -472,41 +837,97 @@ def append_emails_to_copy_of_csv(csv_path, url_column_name='website', overwrite=
             return
     
     print('Generating CSV with emails from {}'.format(csv_path))
-    tqdm.pandas()
     df = pd.read_csv(csv_path)
-    df['emails'] = df[url_column_name].progress_apply(get_emails)
-    df_emails = pd.DataFrame(df.emails.values.tolist(),
-                             index=df.index).add_prefix('email_')
+    urls = list(dict.fromkeys(df[url_column_name].dropna()))
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        # tqdm goes first in zip() so it is exhausted, and the bar completes and closes
+        url_emails = dict((url, emails) for emails, url in
+                          zip(tqdm(executor.map(get_emails, urls), total=len(urls)), urls))
+    df['emails'] = [url_emails.get(url, list()) for url in df[url_column_name]]
+    df_emails = pd.DataFrame(df.emails.tolist(), index=df.index).add_prefix('email_')
     df = pd.concat((df, df_emails), axis=1)
     df.to_csv(new_path, index=False)
     print('CSV with emails created from {}'.format(csv_path))
     return
 
 
-def grab_data_for_postal_code(establishment, postal_code, country_code):
+@lru_cache(maxsize=1)
+def load_state_postal_codes(file_name='./us_postal_codes.csv'):
 
-    '''Create a CSV file containing contact data for a given place-type and postal code
+    '''Returns a dict of state code to the set of its postal codes
+
+    The postal code CSV is read once per process, however many states are grabbed.
     '''
 
-    check_establishment(establishment)
+    state_postal_codes = defaultdict(set)
+    with open(file_name, 'r', newline='', encoding='utf-8') as r:
+        reader = csv.reader(r)
+        header = next(reader)
+        postal_idx = header.index('Zip Code')
+        state_idx = header.index('State Abbreviation')
+        for row in reader:
+            state_postal_codes[row[state_idx]].add(int(row[postal_idx]))
+
+    return {state_code: frozenset(postal_codes)
+            for state_code, postal_codes in state_postal_codes.items()}
+
+
+def fetch_establishment_data(place_ids, executor, detail_futures):
+
+    '''Helper for grab_postal_code(), returns a row of data for each of the place_ids
+
+    Fetches are submitted to executor as place_ids arrive. detail_futures maps
+    each place_id to its fetch; a state shares it across postal codes, so a
+    place found from overlapping searches is only fetched once.
+    '''
+
+    futures = list()
+    for place_id in place_ids:
+        with DETAIL_FUTURES_LOCK:
+            if place_id not in detail_futures:
+                detail_futures[place_id] = executor.submit(get_establishment_data, place_id)
+            futures.append(detail_futures[place_id])
+
+    return [future.result() for future in futures]
+
+
+def grab_postal_code(establishment, postal_code, country_code, log_fh, executor,
+                     detail_futures=None):
+
+    '''Helper for grab_data_for_postal_code() and grab_data_for_state(), returns a status message
+
+    The data folders must already exist and log_fh is the open logfile. Place
+    details are fetched on executor; a state shares it and detail_futures
+    across postal codes.
+    '''
+
+    if detail_futures is None:
+        detail_futures = dict()
 
     postal_code = '{:05}'.format(int(postal_code))
     coors = get_coordinates(postal_code, country_code)
     if coors:
-        place_ids = get_place_ids(establishment,
-                                  coors.lat, coors.lng,
-                                  coors.rad)
-        establishment_data = [get_establishment_data(pid) for pid in place_ids]
+        place_ids = iter_place_ids(establishment, coors.lat, coors.lng, coors.rad)
+        # Each place_id is submitted as its page arrives, overlapping pagination
+        establishment_data = fetch_establishment_data(place_ids, executor, detail_futures)
         created = write_establishment_data(establishment_data, establishment,
-                                           postal_code, country_code)
+                                           postal_code, country_code, log_fh)
         if created:
-            print('{} CSV for postal code {} created  '.format(establishment, postal_code),
-                  end='')
-        else:
-            print('no {} found for postal code {}     '.format(establishment, postal_code),
-                  end='')
-    else:
-        print('no {} found for postal code {}     '.format(establishment, postal_code),
+            return '{} CSV for postal code {} created  '.format(establishment, postal_code)
+
+    return 'no {} found for postal code {}     '.format(establishment, postal_code)
+
+
+def grab_data_for_postal_code(establishment, postal_code, country_code):
+
+    '''Create a CSV file containing contact data for a given place-type and postal code
+    '''
+
+    check_establishment(establishment)
+
+    logfile = make_data_folders(establishment, country_code)
+    with open(logfile, 'a') as log_fh, ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        print(grab_postal_code(establishment, postal_code, country_code, log_fh, executor),
               end='')
 
     return
@@ -515,23 +936,44 @@ def grab_data_for_postal_code(establishment, postal_code, country_code):
 def grab_data_for_state(establishment, state_code, country_code):
 
     '''Create a CSV file containing contact data for a given place-type and state
+
+    Up to STATE_WORKERS postal codes are grabbed at once, and all of their place
+    details are fetched on one shared pool of MAX_WORKERS threads.
     '''
 
     check_establishment(establishment)
     check_state_code(state_code)
-
-    state_postal_code_file = './us_postal_codes.csv'
-    df = pd.read_csv(state_postal_code_file, engine='python')
-    postal_list = list(set(df[df['State Abbreviation'] == state_code]['Zip Code']))
-    postal_code_num_all = len(postal_list)
-    postal_list, postal_code_num_diff = check_current_data(establishment, country_code, 
-                                                           postal_list, state_code)
-
-    for e, postal_code in enumerate(postal_list):
-        grab_data_for_postal_code(establishment, postal_code, country_code)
-        print('|{:04}/{:04}|'.format(e + postal_code_num_diff + 1, postal_code_num_all))
-
-    concatenate_postal_codes_for_state(establishment, country_code, postal_list, state_code)
+    get_key()  # prompt for a missing key before the work is spread over threads
+
+    postal_set = set(load_state_postal_codes().get(state_code, frozenset()))
+    postal_code_num_all = len(postal_set)
+    logfile = make_data_folders(establishment, country_code)
+    to_grab_set, postal_code_num_diff = check_current_data(establishment, country_code,
+                                                           postal_set, state_code)
+
+    # Line buffered so finished postal codes are on disk if the run is interrupted
+    with open(logfile, 'a', buffering=1) as log_fh, \
+            ThreadPoolExecutor(max_workers=MAX_WORKERS) as detail_executor, \
+            ThreadPoolExecutor(max_workers=STATE_WORKERS) as executor:
+        detail_futures = dict()
+        futures = [executor.submit(grab_postal_code, establishment, postal_code,
+                                   country_code, log_fh, detail_executor, detail_futures)
+                   for postal_code in sorted(to_grab_set)]
+        try:
+            for e, future in enumerate(as_completed(futures)):
+                print(future.result(), end='')
+                print('|{:04}/{:04}|'.format(e + postal_code_num_diff + 1, postal_code_num_all))
+        except BaseException:
+            # Stop at the first failure (e.g. a revoked key) rather than letting
+            # the pools run every remaining postal code before re-raising
+            for future in futures:
+                future.cancel()
+            with DETAIL_FUTURES_LOCK:
+                for future in detail_futures.values():
+                    future.cancel()
+            raise
+
+    concatenate_postal_codes_for_state(establishment, country_code, postal_set, state_code)
     return
 
 
@@ -551,44 +993,9 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description=desc,
                                      formatter_class=argparse.RawDescriptionHelpFormatter)
 
-    accepted_establishments = ['accounting', 'airport', 'amusement_park', 'aquarium',
-                               'art_gallery', 'atm', 'bakery', 'bank', 'bar',
-                               'beauty_salon', 'bicycle_store', 'book_store',
-                               'bowling_alley', 'bus_station', 'cafe', 'campground',
-                               'car_dealer', 'car_rental', 'car_repair', 'car_wash',
-                               'casino', 'cemetery', 'church', 'city_hall',
-                               'clothing_store', 'convenience_store', 'courthouse',
-                               'dentist', 'department_store', 'doctor', 'electrician',
-                               'electronics_store', 'embassy', 'fire_station',
-                               'florist', 'funeral_home', 'furniture_store',
-                               'gas_station', 'gym', 'hair_care', 'hardware_store',
-                               'hindu_temple', 'home_goods_store', 'hospital',
-                               'insurance_agency', 'jewelry_store', 'laundry',
-                               'lawyer', 'library', 'light_rail_station',
-                               'liquor_store', 'local_government_office',
-                               'locksmith', 'lodging', 'meal_delivery',
-                               'meal_takeaway', 'mosque', 'movie_rental',
-                               'movie_theater', 'moving_company', 'museum',
-                               'night_club', 'painter', 'park', 'parking', 'pet_store',
-                               'pharmacy', 'physiotherapist', 'plumber', 'police',
-                               'post_office', 'real_estate_agency', 'restaurant',
-                               'roofing_contractor', 'rv_park', 'school', 'shoe_store',
-                               'shopping_mall', 'spa', 'stadium', 'storage', 'store',
-                               'subway_station', 'synagogue', 'taxi_stand',
-                               'train_station', 'transit_station', 'travel_agency',
-                               'university', 'veterinary_care', 'zoo']
-
-    accepted_state_codes = ['AA', 'AK', 'AL', 'AP', 'AR', 'AZ', 'CA', 'CO', 'CT',
-                            'DC', 'DE', 'FL', 'FM', 'GA', 'HI', 'IA', 'ID', 'IL',
-                            'IN', 'KS', 'KY', 'LA', 'MA', 'MD', 'ME', 'MH', 'MI',
-                            'MN', 'MO', 'MP', 'MS', 'MT', 'NC', 'ND', 'NE', 'NH',
-                            'NJ', 'NM', 'NV', 'NY', 'OH', 'OK', 'OR', 'PA', 'PW',
-                            'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 'VA', 'VT', 'WA',
-                            'WI', 'WV', 'WY']
-
     accepted_country_codes = [c.alpha_2 for c in pycountry.countries]
 
-    parser.add_argument('-e', '--establishment', nargs='+', choices=accepted_establishments,
+    parser.add_argument('-e', '--establishment', nargs='+', choices=sorted(ACCEPTED_TYPES),
                         help=str('Input one or more of the establishment types listed above '
                                  'to determine from which organizations you collect contact '
                                  'info.  List here should align with Google\'s Places API '
@@ -601,10 +1008,10 @@ if __name__ == '__main__':
                                  'postal codes you collect contact info.  If you use this '
                                  'option you must also specify the establishment type(s) with '
                                  'with "-e"/"--establishment".'))
-    parser.add_argument('-s', '--statecode', nargs='?', choices=accepted_state_codes, 
+    parser.add_argument('-s', '--statecode', nargs='+', choices=sorted(ACCEPTED_STATE_CODES),
                         help=str('Only used in conjunction with the "--fullstate" flag, and '
-                                 'can only used for the US.  Input one of the state codes to '
-                                 'grab contact info for the chosen establishment(s).'))
+                                 'can only used for the US.  Input one or more of the state '
+                                 'codes to grab contact info for the chosen establishment(s).'))
     parser.add_argument('-c', '--countrycode', nargs='?', default='US',
                         choices=accepted_country_codes,
                         help=str('If you want to search non-US postal codes, input one '
@@ -637,13 +1044,14 @@ if __name__ == '__main__':
                   'Use "python3 grab_contacts_from_gmaps.py -h" to get more info\n')
         else:
             for establishment in args.establishment:
-                print('Working...')
-                grab_data_for_state(establishment, args.statecode, args.countrycode)
-                if not args.omitemails:
-                    csv_path = os.path.join('data', establishment, args.countrycode, 
-                                            '{}_all_postal_codes.csv'.format(args.statecode))
-                    print()
-                    append_emails_to_copy_of_csv(csv_path)
+                for state_code in args.statecode:
+                    print('Working...')
+                    grab_data_for_state(establishment, state_code, args.countrycode)
+                    if not args.omitemails:
+                        csv_path = os.path.join('data', establishment, args.countrycode,
+                                                '{}_all_postal_codes.csv'.format(state_code))
+                        print()
+                        append_emails_to_copy_of_csv(csv_path)
     elif all((args.establishment, args.postalcode)):
         for establishment in args.establishment:
             for postal_code in args.postalcode:
@@ -666,7 +1074,7 @@ if __name__ == '__main__':
         print('\n\n' + desc + '\n\n')
         establishment = input('Establishment type?: ').lower()
         postal_code = input('Postal code: ')
-        if not re.match(r'\d\d\d\d\d', postal_code):
+        if not POSTAL_CODE_REGEX.fullmatch(postal_code):
              print('Invalid postal code. Five digit codes only\n')
              raise UnacceptedInput
         print('Working...')